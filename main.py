@@ -1,5 +1,6 @@
 from fastmcp import FastMCP
-import os, aiosqlite, tempfile
+from concurrent.futures import ThreadPoolExecutor
+import os, json, atexit, datetime, asyncio, sqlite3, tempfile, threading, functools
 
 # Use temporary directory for database which should be writable
 TEMP_DIR = tempfile.gettempdir()
@@ -12,15 +13,91 @@ CATEGORIES_PATH = os.path.join(os.path.dirname(__file__), "categories.json")
 
 print(f"Using database at: {DB_PATH}")
 
+# Tuning applied to every database connection, including the one used by init_db
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;", # Enable WAL mode for better concurrency
+    "PRAGMA synchronous=NORMAL;", # No fsync on every commit; still durable in WAL mode
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-64000;", # 64 MB page cache
+    "PRAGMA mmap_size=268435456;", # 256 MB memory-mapped I/O
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA wal_autocheckpoint=1000;", # Checkpoint every 1000 pages to bound WAL growth
+    "PRAGMA journal_size_limit=6144000;", # Truncate the WAL back to ~6 MB after checkpoints
+    "PRAGMA analysis_limit=400;", # Keep ANALYZE and PRAGMA optimize approximate and fast
+)
+
+# Size of sqlite3's per-connection prepared-statement cache (keyed by SQL text)
+STATEMENT_CACHE_SIZE = 256
+
+# Number of reader threads; WAL lets readers run alongside the single writer
+READ_POOL_SIZE = min(os.cpu_count() or 1, 4)
+
+# One writer thread serializes every write; readers run on their own thread pool.
+# Each worker thread owns a persistent connection, opened on its first query.
+_WRITE_EXEC: ThreadPoolExecutor | None = None
+_READ_EXEC: ThreadPoolExecutor | None = None
+_LOCAL = threading.local()
+
+# Write transactions between planner-statistics refreshes on the long-lived writer connection.
+# Before SQLite 3.46, PRAGMA optimize only looks at tables this connection queried, and the
+# writer never runs the range queries, so older libraries analyze the table directly instead.
+OPTIMIZE_EVERY_WRITES = 1000
+OPTIMIZE_SQL = "PRAGMA optimize=0x10002;" if sqlite3.sqlite_version_info >= (3, 46, 0) else "ANALYZE expenses;"
+_WRITES_SINCE_OPTIMIZE = 0
+
+# Single inserts already queued when the writer is free are committed together in one transaction
+WRITE_BATCH_MAX_ROWS = 100
+_WRITE_QUEUE: asyncio.Queue | None = None
+_WRITE_TASK: asyncio.Task | None = None
+
+# SQL for the tool handlers, kept as module constants so every call passes the same string
+# object and hits the connection's prepared-statement cache
+INSERT_EXPENSE_SQL = "INSERT INTO expenses (date, amount, category, subcategory, note) VALUES (?, ?, ?, ?, ?)"
+INSERT_EXPENSE_RETURNING_SQL = INSERT_EXPENSE_SQL + " RETURNING id"
+# SQLite's json1 builds the whole array in C; the subquery fixes the row order fed to the aggregate
+LIST_EXPENSES_SQL = """
+    SELECT json_group_array(json_object('id', id, 'date', date, 'amount', amount, 'category', category, 'subcategory', subcategory, 'note', note))
+    FROM (SELECT id, date, amount, category, subcategory, note FROM expenses WHERE date_ord BETWEEN CAST(julianday(?, 'start of day') AS INTEGER) AND CAST(julianday(?, 'start of day') AS INTEGER) ORDER BY date DESC, id DESC)
+"""
+SUMMARIZE_ALL_SQL = "SELECT category, SUM(amount) as total_amount, COUNT(*) as count FROM expenses WHERE date_ord BETWEEN CAST(julianday(?, 'start of day') AS INTEGER) AND CAST(julianday(?, 'start of day') AS INTEGER) GROUP BY category ORDER BY total_amount DESC"
+SUMMARIZE_CATEGORY_SQL = "SELECT category, SUM(amount) as total_amount, COUNT(*) as count FROM expenses WHERE date_ord BETWEEN CAST(julianday(?, 'start of day') AS INTEGER) AND CAST(julianday(?, 'start of day') AS INTEGER) AND category = ? GROUP BY category ORDER BY total_amount DESC"
+DELETE_EXPENSE_SQL = "DELETE FROM expenses WHERE id = ?"
+UPDATE_EXPENSE_SQL = "UPDATE expenses SET date = ?, amount = ?, category = ?, subcategory = ?, note = ? WHERE id = ?"
+
+# Every connection opened by a worker thread, so they can all be closed at process exit
+_CONNECTIONS: list[sqlite3.Connection] = []
+
+def close_db():
+    """ Shut down the database threads and optimize and close their connections. """
+    global _WRITE_EXEC, _READ_EXEC
+    for executor in (_WRITE_EXEC, _READ_EXEC):
+        if executor is not None:
+            executor.shutdown(wait=True) # Let in-flight queries finish first
+    for c in _CONNECTIONS:
+        try:
+            # Refresh planner statistics for the queries this connection ran; a no-op when
+            # nothing has changed enough to matter. Readers need query_only lifted to write them.
+            c.execute("PRAGMA query_only=0;")
+            c.execute("PRAGMA optimize;")
+        except sqlite3.Error as e:
+            print(f"PRAGMA optimize failed: {e}")
+        c.close()
+    _CONNECTIONS.clear()
+    _WRITE_EXEC = _READ_EXEC = None
+
+# Connections live for the whole process. MCP lifespans can run once per session, so
+# tearing down there would reopen everything per request; close them at exit instead.
+atexit.register(close_db)
+
 # Create a FastMCP server instance
 mcp = FastMCP("Expense Tracker")
 
 def init_db(): # Initialize the database synchronously
     """ Initialize the SQLite database and create the expenses table if it doesn't exist. """
     try:
-        import sqlite3
         with sqlite3.connect(DB_PATH) as c:
-            c.execute("PRAGMA journal_mode=WAL;") # Enable WAL mode for better concurrency
+            for pragma in CONNECTION_PRAGMAS:
+                c.execute(pragma)
             c.execute("""
                 CREATE TABLE IF NOT EXISTS expenses (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -28,9 +105,20 @@ def init_db(): # Initialize the database synchronously
                     amount REAL NOT NULL,
                     category TEXT NOT NULL,
                     subcategory TEXT DEFAULT '',
-                    note TEXT DEFAULT ''
+                    note TEXT DEFAULT '',
+                    date_ord INTEGER AS (CAST(julianday(date, 'start of day') AS INTEGER)) VIRTUAL
                 )     
             """)
+            # Day number of the calendar date; 'start of day' because Julian days roll over at noon.
+            # Rows whose date SQLite can't parse get NULL and never match a date range, which is
+            # why the tools only accept YYYY-MM-DD dates. Older databases get the column in place.
+            if "date_ord" not in {col[1] for col in c.execute("PRAGMA table_xinfo(expenses)")}:
+                c.execute("ALTER TABLE expenses ADD COLUMN date_ord INTEGER AS (CAST(julianday(date, 'start of day') AS INTEGER)) VIRTUAL")
+            # Date-range filters compare integer day numbers instead of TEXT; the per-category
+            # summary seeks on the same index, so no separate index on date_ord is needed
+            c.execute("DROP INDEX IF EXISTS idx_expenses_date_cat") # Earlier TEXT (date, category) index
+            c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_date_ord_cat ON expenses(date_ord, category)")
+            c.execute("ANALYZE;") # Collect planner statistics so the index is chosen from the first query
             # Test write access
             c.execute("INSERT OR IGNORE INTO expenses(date, amount, category) VALUES ('2000-01-01', 0, 'test')")
             c.execute("DELETE FROM expenses WHERE category = 'test'")
@@ -42,101 +130,252 @@ def init_db(): # Initialize the database synchronously
 # Initialize database synchronously at module load
 init_db()
 
+def open_connection(read_only: bool = False) -> sqlite3.Connection:
+    """ Open a new database connection with the shared tuning pragmas applied. """
+    # check_same_thread=False only so close_db can close it after its thread has stopped
+    c = sqlite3.connect(DB_PATH, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        c.execute(pragma)
+    if read_only:
+        c.execute("PRAGMA query_only=1;") # Reject writes on reader connections
+    _CONNECTIONS.append(c)
+    return c
+
+def thread_connection(read_only: bool = False) -> sqlite3.Connection:
+    """ Return the calling worker thread's connection, opening it on first use. """
+    c = getattr(_LOCAL, "conn", None)
+    if c is None:
+        c = _LOCAL.conn = open_connection(read_only)
+    return c
+
+def thread_cursor() -> sqlite3.Cursor:
+    """ Return a cursor on the calling worker thread's connection, reused across calls. """
+    cursor = getattr(_LOCAL, "cursor", None)
+    if cursor is None:
+        cursor = _LOCAL.cursor = thread_connection().cursor()
+    return cursor
+
+def _write_and_optimize(fn, *args):
+    """ Run a write on the writer thread, refreshing planner statistics every OPTIMIZE_EVERY_WRITES calls. """
+    global _WRITES_SINCE_OPTIMIZE
+    result = fn(*args)
+    _WRITES_SINCE_OPTIMIZE += 1 # Only ever touched on the single writer thread
+    if _WRITES_SINCE_OPTIMIZE >= OPTIMIZE_EVERY_WRITES:
+        _WRITES_SINCE_OPTIMIZE = 0
+        try:
+            thread_connection().execute(OPTIMIZE_SQL)
+        except sqlite3.Error as e:
+            print(f"PRAGMA optimize failed: {e}")
+    return result
+
+async def run_write(fn, *args):
+    """ Run fn on the single writer thread and return its result. """
+    global _WRITE_EXEC
+    if _WRITE_EXEC is None:
+        _WRITE_EXEC = ThreadPoolExecutor(max_workers=1, thread_name_prefix="expenses-writer")
+    return await asyncio.get_running_loop().run_in_executor(_WRITE_EXEC, _write_and_optimize, fn, *args)
+
+async def run_read(fn, *args):
+    """ Run fn on a reader thread and return its result. """
+    global _READ_EXEC
+    if _READ_EXEC is None:
+        _READ_EXEC = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="expenses-reader")
+    return await asyncio.get_running_loop().run_in_executor(_READ_EXEC, fn, *args)
+
+def _insert_expenses(rows: list[tuple]) -> list:
+    """ Insert rows in one transaction, returning each row's new ID or the error it raised. """
+    c = thread_connection()
+    results = []
+    with c:
+        for params in rows:
+            try:
+                results.append(c.execute(INSERT_EXPENSE_SQL, params).lastrowid)
+            except Exception as e: # A bad row fails on its own without aborting the batch
+                results.append(e)
+    return results
+
+async def _write_coalescer():
+    """ Drain queued inserts and commit each batch in a single transaction. """
+    while True:
+        batch = [await _WRITE_QUEUE.get()]
+        await asyncio.sleep(0) # Let callers already scheduled in this loop pass enqueue, without a timer
+        # Take only what is queued now; rows arriving during the commit form the next batch
+        while len(batch) < WRITE_BATCH_MAX_ROWS and not _WRITE_QUEUE.empty():
+            batch.append(_WRITE_QUEUE.get_nowait())
+        try:
+            results = await run_write(_insert_expenses, [params for params, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done(): # Caller was cancelled while waiting
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+async def queue_insert(params: tuple) -> int:
+    """ Queue a single expense insert for the next batch commit and return its new ID. """
+    global _WRITE_QUEUE, _WRITE_TASK
+    if _WRITE_TASK is None or _WRITE_TASK.get_loop() is not asyncio.get_running_loop():
+        _WRITE_QUEUE = asyncio.Queue()
+        _WRITE_TASK = asyncio.create_task(_write_coalescer())
+    future = asyncio.get_running_loop().create_future()
+    _WRITE_QUEUE.put_nowait((params, future))
+    return await future
+
+def is_iso_date(value) -> bool:
+    """ Check that value is a YYYY-MM-DD date, the only form the date_ord range filters match. """
+    try:
+        return datetime.date.fromisoformat(value).isoformat() == value # Rejects compact and week forms
+    except (TypeError, ValueError):
+        return False
+
+def invalid_date(value) -> dict:
+    """ Build the error payload returned for a date that isn't YYYY-MM-DD. """
+    return {"status": "error", "message": f"Invalid date {value!r}: expected YYYY-MM-DD"}
+
+def db_tool(error_message: str):
+    """ Wrap an async tool so SQLite errors are returned as an error payload prefixed with error_message. """
+    def decorator(fn):
+        @functools.wraps(fn) # Keep the signature and docstring FastMCP builds the tool schema from
+        async def wrapper(*args, **kwargs):
+            try:
+                return await fn(*args, **kwargs)
+            except sqlite3.Error as e:
+                if "readonly" in str(e).lower():
+                    return {"status": "error", "message": "Database is in read-only mode. Check file permissions."}
+                return {"status": "error", "message": f"{error_message}: {str(e)}"}
+        return wrapper
+    return decorator
+
 @mcp.tool()
+@db_tool("Database error")
 async def add_expense(date: str, amount: float, category: str, subcategory: str = "", note: str = "") -> dict:
     """ Add a new expense entry to the database. """
-    try:
-        async with aiosqlite.connect(DB_PATH) as c:
-            cursor = await c.execute(
-                "INSERT INTO expenses (date, amount, category, subcategory, note) VALUES (?, ?, ?, ?, ?)",
-                (date, amount, category, subcategory, note)
-            )
-            expense_id = cursor.lastrowid
-            await c.commit()
-            return {"status": "success", "id": expense_id, "message": "Expense added successfully"}
-    except Exception as e:
-        if "readonly" in str(e).lower():
-            return {"status": "error", "message": "Database is in read-only mode. Check file permissions."}
-        return {"status": "error", "message": f"Database error: {str(e)}"}
+    if not is_iso_date(date):
+        return invalid_date(date)
+    expense_id = await queue_insert((date, amount, category, subcategory, note))
+    return {"status": "success", "id": expense_id, "message": "Expense added successfully"}
+
+def _bulk_insert_expenses(rows: list[tuple]) -> list[int]:
+    """ Insert all rows in one transaction and return their new IDs; any failure rolls back the whole batch. """
+    c = thread_connection()
+    with c:
+        c.execute("BEGIN IMMEDIATE") # Take the write lock up front rather than upgrading mid-batch
+        # executemany can't return rows, so step the cached RETURNING statement once per row
+        return [c.execute(INSERT_EXPENSE_RETURNING_SQL, params).fetchone()[0] for params in rows]
 
 @mcp.tool()
-async def list_expenses(start_date: str, end_date: str) -> list[dict]:
-    """ List all expense entries from the database within an inclusive date range. """
+@db_tool("Database error")
+async def bulk_add_expenses(entries: list[dict]) -> dict:
+    """ Add several expense entries in a single transaction. Each entry needs date, amount and category; subcategory and note are optional. """
     try:
-        async with aiosqlite.connect(DB_PATH) as c:
-            cursor = await c.execute("SELECT id, date, amount, category, subcategory, note FROM expenses WHERE date BETWEEN ? AND ? ORDER BY date DESC, id DESC", (start_date, end_date))
-            cols = [d[0] for d in cursor.description]
-            rows = await cursor.fetchall()
-            return [dict(zip(cols,row)) for row in rows]
-    except Exception as e:
-        return {"status": "error", "message": f"Error listing expenses: {str(e)}"}
+        rows = [
+            (e["date"], e["amount"], e["category"], e.get("subcategory", ""), e.get("note", ""))
+            for e in entries
+        ]
+    except KeyError as e:
+        return {"status": "error", "message": f"Missing field in expense entry: {e}"}
+    for row in rows:
+        if not is_iso_date(row[0]):
+            return invalid_date(row[0])
+    ids = await run_write(_bulk_insert_expenses, rows)
+    return {"status": "success", "count": len(ids), "ids": ids, "message": "Expenses added successfully"}
+
+def _list_expenses(start_date: str, end_date: str) -> str:
+    """ Fetch the expenses in a date range on a reader thread as a JSON array. """
+    return thread_connection(read_only=True).execute(LIST_EXPENSES_SQL, (start_date, end_date)).fetchone()[0]
+
+@mcp.tool()
+@db_tool("Error listing expenses")
+async def list_expenses(start_date: str, end_date: str) -> str | dict:
+    """ List all expense entries from the database within an inclusive date range, as a JSON array, or an error payload. """
+    for value in (start_date, end_date):
+        if not is_iso_date(value):
+            return invalid_date(value)
+    return await run_read(_list_expenses, start_date, end_date)
         
+def _summarize_expenses_by_category(start_date: str, end_date: str, category: str) -> list[dict]:
+    """ Total the expenses per category on a reader thread. """
+    sql, params = (SUMMARIZE_CATEGORY_SQL, (start_date, end_date, category)) if category else (SUMMARIZE_ALL_SQL, (start_date, end_date))
+    rows = thread_connection(read_only=True).execute(sql, params).fetchall()
+    return [{"category": r[0], "total_amount": r[1], "count": r[2]} for r in rows]
+
 @mcp.tool()
+@db_tool("Error summarizing expenses")
 async def summarize_expenses_by_category(start_date: str, end_date: str, category: str = "") -> dict:
     """ Summarize total expenses by category within a specified date range. """
-    try:
-        async with aiosqlite.connect(DB_PATH) as c:
-            if category:
-                cursor = await c.execute("SELECT category, SUM(amount) as total_amount, COUNT(*) as count FROM expenses WHERE date BETWEEN ? AND ? AND category = ? GROUP BY category ORDER BY total_amount DESC", (start_date, end_date, category))
-            else:
-                cursor = await c.execute("SELECT category, SUM(amount) as total_amount, COUNT(*) as count FROM expenses WHERE date BETWEEN ? AND ? GROUP BY category ORDER BY total_amount DESC", (start_date, end_date))
-            cols = [d[0] for d in cursor.description]
-            rows = await cursor.fetchall()
-            return [dict(zip(cols,row)) for row in rows]
-    except Exception as e:
-        return {"status": "error", "message": f"Error summarizing expenses: {str(e)}"}
+    for value in (start_date, end_date):
+        if not is_iso_date(value):
+            return invalid_date(value)
+    return await run_read(_summarize_expenses_by_category, start_date, end_date, category)
     
+def _delete_expense(expense_id: int) -> int:
+    """ Delete an expense on the writer thread and return the number of rows removed. """
+    cursor = thread_cursor()
+    with cursor.connection:
+        cursor.execute(DELETE_EXPENSE_SQL, (expense_id,))
+    return cursor.rowcount
+
 @mcp.tool()
+@db_tool("Error deleting expense")
 async def delete_expense(expense_id: int) -> dict:
     """ Delete an expense entry from the database by its ID. """
-    try:
-        async with aiosqlite.connect(DB_PATH) as c:
-            cursor = await c.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
-            await c.commit()
-            return {"status": "ok", "deleted": cursor.rowcount}
-    except Exception as e:
-        return {"status": "error", "message": f"Error deleting expense: {str(e)}"}
+    deleted = await run_write(_delete_expense, expense_id)
+    return {"status": "ok", "deleted": deleted}
     
+def _update_expense(expense_id: int, date: str, amount: float, category: str, subcategory: str, note: str) -> int:
+    """ Update an expense on the writer thread and return the number of rows changed. """
+    cursor = thread_cursor()
+    with cursor.connection:
+        cursor.execute(UPDATE_EXPENSE_SQL, (date, amount, category, subcategory, note, expense_id))
+    return cursor.rowcount
+
 @mcp.tool()
+@db_tool("Error updating expense")
 async def update_expense(expense_id: int, date: str, amount: float, category: str, subcategory: str = "", note: str = "") -> dict:
     """ Update an existing expense entry in the database by its ID. """
-    try:
-        async with aiosqlite.connect(DB_PATH) as c:
-            cursor = await c.execute(
-                "UPDATE expenses SET date = ?, amount = ?, category = ?, subcategory = ?, note = ? WHERE id = ?",
-                (date, amount, category, subcategory, note, expense_id)
-            )
-            await c.commit()
-            return {"status": "ok", "updated": cursor.rowcount}
-    except Exception as e:
-        return {"status": "error", "message": f"Error updating expense: {str(e)}"}
+    if not is_iso_date(date):
+        return invalid_date(date)
+    updated = await run_write(_update_expense, expense_id, date, amount, category, subcategory, note)
+    return {"status": "ok", "updated": updated}
     
+# Default categories served when the categories JSON file doesn't exist, serialized once at import
+DEFAULT_CATEGORIES_JSON = json.dumps({
+    "categories": [
+        "Food & Dining",
+        "Transportation",
+        "Shopping",
+        "Entertainment",
+        "Bills & Utilities",
+        "Healthcare",
+        "Travel",
+        "Education",
+        "Business",
+        "Other"
+    ]
+}, separators=(",", ":"))
+
+# Contents of the categories JSON file, keyed by the file's modification time
+_CAT_CACHE: tuple[int, str] | None = None
+
 @mcp.resource("expense:///categories", mime_type="application/json")
 def get_categories():
     """ Serve the categories JSON file as a resource. """
+    global _CAT_CACHE
     try:
-        # Provide default categories if file doesn't exist
-        default_categories = {
-            "categories": [
-                "Food & Dining",
-                "Transportation",
-                "Shopping",
-                "Entertainment",
-                "Bills & Utilities",
-                "Healthcare",
-                "Travel",
-                "Education",
-                "Business",
-                "Other"
-            ]
-        }
         try:
-            # Read a fresh copy of the categories JSON file each time the resource is requested
-            with open(CATEGORIES_PATH, "r", encoding="utf-8") as f:
-                return f.read()
+            st = os.stat(CATEGORIES_PATH)
         except FileNotFoundError:
-            import json
-            return json.dumps(default_categories, indent=2)
+            return DEFAULT_CATEGORIES_JSON
+        # Only re-read the file when it has changed since the last request
+        if _CAT_CACHE is not None and _CAT_CACHE[0] == st.st_mtime_ns:
+            return _CAT_CACHE[1]
+        with open(CATEGORIES_PATH, "r", encoding="utf-8") as f:
+            data = f.read()
+        _CAT_CACHE = (st.st_mtime_ns, data)
+        return data
     except Exception as e:
         return {"status": "error", "message": f"Error reading categories: {str(e)}"}
 
@@ -1,12 +1,35 @@
 from fastmcp import FastMCP
+from fastmcp.client.transports import StreamableHttpTransport
+import httpx
 
-# Create a proxy to your remote FastMCP Cloud server instance
+# URL of your remote FastMCP Cloud server instance
 # FastMCP Cloud uses Streamable HTTP (default), so just use the URL of your instance
+REMOTE_URL = "https://nearby-chocolate-toucan.fastmcp.app/mcp" # Standard FastMCP Cloud URL
+
+# Idle upstream connections kept open for reuse by requests made during one proxied session
+UPSTREAM_LIMITS = httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60.0)
+
+def upstream_client(headers: dict[str, str] | None = None, timeout: httpx.Timeout | None = None, auth: httpx.Auth | None = None, **kwargs) -> httpx.AsyncClient:
+    """ Build the HTTP/2, keep-alive HTTP client used for requests to the remote server. """
+    kwargs.setdefault("follow_redirects", True) # As mcp's default client does, e.g. for /mcp -> /mcp/
+    return httpx.AsyncClient(
+        headers=headers,
+        # The transport passes a long read timeout for its event stream; keep it when given
+        timeout=timeout or httpx.Timeout(30.0, read=300.0),
+        auth=auth,
+        http2=True, # Multiplexes concurrent upstream calls over one TLS connection
+        limits=UPSTREAM_LIMITS,
+        **kwargs,
+    )
+
+# Create a proxy to your remote FastMCP Cloud server instance
+# Each proxied request gets its own upstream session, which keeps logs, progress, sampling and
+# elicitation tied to the request that caused them; the HTTP client only applies within a session
 mcp = FastMCP.as_proxy(
-    "https://nearby-chocolate-toucan.fastmcp.app/mcp", # Standard FastMCP Cloud URL
+    StreamableHttpTransport(REMOTE_URL, httpx_client_factory=upstream_client),
     name="Sayam Proxy Server"
 )
 
 if __name__ == "__main__":
     # This runs via STDIO, which Claude Desktop can communicate with
-    mcp.run()
\ No newline at end of file
+    mcp.run()